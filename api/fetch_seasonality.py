@@ -3,12 +3,60 @@
 from http.server import BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
 from datetime import datetime
-import yfinance as yf
+from functools import lru_cache
 import json
+import time
 
-yf.set_tz_cache_location("/tmp/yfinance_cache")
+# yfinance (and the pandas/numpy stack behind it) is imported on first use so that
+# requests rejected by validation never pay its import cost on a cold start.
+_yf = None
+
+def _yfinance():
+    global _yf
+    if _yf is None:
+        import yfinance as yf
+        yf.set_tz_cache_location("/tmp/yfinance_cache")
+        _yf = yf
+    return _yf
+
+class NoPriceData(Exception):
+    """
+    Raised when yfinance returns no price history for the requested ticker and start year.
+    """
+
+# Warm invocations share this module, so repeat requests within the hour are served from memory.
+@lru_cache(maxsize=256)
+def _price_history_json(ticker, start_year, hour_bucket):
+    """
+    Returns a ticker's daily closes since January 1 of start_year as the encoded JSON body.
+    'hour_bucket' only keys the cache, so entries expire every hour.
+    Raises NoPriceData when yfinance has no data; lru_cache does not store exceptions, so a transient
+    empty response is retried on the next request instead of being served as a 404 for the rest of the hour.
+    """
+    start_date = datetime(start_year, 1, 1)
+    end_date = datetime.now()
+
+    stock = _yfinance().Ticker(ticker)
+    data = stock.history(start=start_date, end=end_date, auto_adjust=True)
+
+    if data.empty:
+        raise NoPriceData(ticker)
+
+    # The seasonality views only read the close, so the other OHLCV columns are not sent.
+    data = data[['Close']]
+
+    # Format the dates in one NumPy cast. The exchange's wall-clock time is taken first because
+    # .values on a tz-aware index is in UTC, which is the previous day for Asian markets.
+    data.index = data.index.tz_localize(None).values.astype('datetime64[D]').astype(str)
+    # pandas encodes the frame straight to JSON in C, without building a dict per row first. Its default of 10
+    # decimal places would flatten sub-cent closes (e.g. 1e-9 for SHIB-USD), so the maximum precision is kept.
+    return data.to_json(orient='index', double_precision=15).encode()
 
 class handler(BaseHTTPRequestHandler):
+    # Buffer the socket writes so the headers and the body leave in a single flush at the end
+    # of the request, instead of one unbuffered write each.
+    wbufsize = 1024 * 1024
+
     def do_GET(self):
         query = parse_qs(urlparse(self.path).query)
         ticker = query.get('ticker', [None])[0]
@@ -19,27 +67,20 @@ class handler(BaseHTTPRequestHandler):
             return
 
         try:
-            start_date = datetime(int(start_year), 1, 1)
-            end_date = datetime.now()
-
-            stock = yf.Ticker(ticker)
-            data = stock.history(start=start_date, end=end_date, auto_adjust=True)
-
-            if data.empty:
-                self._respond(404, {'error': f'No data found for ticker "{ticker}" from {start_year}. It may be an invalid symbol.'})
-                return
-
-            data.index = data.index.strftime('%Y-%m-%d')
-            response_data = data.to_dict(orient='index')
+            body = _price_history_json(ticker, int(start_year), int(time.time() // 3600))
+            self._respond(200, body)
 
-            self._respond(200, response_data)
+        except NoPriceData:
+            self._respond(404, {'error': f'No data found for ticker "{ticker}" from {start_year}. It may be an invalid symbol.'})
 
         except Exception as e:
             self._respond(500, {'error': str(e)})
 
     def _respond(self, status_code, payload):
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
         self.send_response(status_code)
         self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
         self.send_header('Access-Control-Allow-Origin', '*')
         self.end_headers()
-        self.wfile.write(json.dumps(payload).encode())
+        self.wfile.write(body)
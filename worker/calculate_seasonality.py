@@ -1,12 +1,15 @@
 # FILE: worker/calculate_seasonality.py
-# --- Updated to process tickers sequentially for reliability and include Crypto ---
+# --- Downloads tickers in threaded yfinance batches and scores each batch as one price matrix ---
 
+import argparse
 import yfinance as yf
 import pandas as pd
 import numpy as np
-import json
+import orjson
 from datetime import datetime, timedelta
+import logging
 import os
+import random
 import time
 
 # --- Configuration ---
@@ -16,103 +19,233 @@ TICKER_FILE_ETFS = 'worker/etfs.txt'
 TICKER_FILE_INDIA = 'worker/india_stocks.txt'
 TICKER_FILE_CRYPTO = 'worker/crypto.txt'
 OUTPUT_FILE = 'public/scan_results.json'
+PRICE_CACHE_DIR = 'worker/.cache/prices'
 
-# Define the asset classes and their corresponding ticker files and trading days
+# Define the asset classes and their corresponding ticker files
 ASSET_CONFIGS = [
-    {'name': 'Stocks', 'file': TICKER_FILE_STOCKS, 'trading_days_in_month': 21},
-    {'name': 'ETFs', 'file': TICKER_FILE_ETFS, 'trading_days_in_month': 21},
-    {'name': 'India Stocks', 'file': TICKER_FILE_INDIA, 'trading_days_in_month': 21},
-    {'name': 'Crypto', 'file': TICKER_FILE_CRYPTO, 'trading_days_in_month': 30}
+    {'name': 'Stocks', 'file': TICKER_FILE_STOCKS},
+    {'name': 'ETFs', 'file': TICKER_FILE_ETFS},
+    {'name': 'India Stocks', 'file': TICKER_FILE_INDIA},
+    {'name': 'Crypto', 'file': TICKER_FILE_CRYPTO}
 ]
 
 FORWARD_PERIODS_MONTHS = [1, 2, 3]
 LOOKBACK_PERIODS_YEARS = sorted([5, 10, 20], reverse=True) 
 MAX_LOOKBACK = LOOKBACK_PERIODS_YEARS[0]
 
-# --- Helper Function to Fetch Price Data ---
-def fetch_price_history(ticker):
+# Tickers requested per yf.download call, and the most of their downloads yfinance may run at once.
+DOWNLOAD_BATCH_SIZE = 100
+MAX_WORKERS = 16
+
+# Attempts per yf.download call before tickers that keep getting rate-limited are given up on.
+DOWNLOAD_RETRIES = 4
+
+# A cached price file younger than this is used as-is, without asking yfinance for new rows.
+PRICE_CACHE_MAX_AGE_HOURS = 12
+
+# A cached history whose last close is older than this is no longer updated in place; it is dropped and the
+# ticker downloaded in full, so a delisted or renamed ticker neither stays frozen nor widens its batch's update.
+PRICE_CACHE_MAX_GAP_DAYS = 10
+
+# --- Helper Functions to Fetch Price Data ---
+class RateLimitWatcher(logging.Filter):
     """
-    Fetches historical daily price data for a single ticker for the maximum lookback period.
+    yf.download records each ticker's YFRateLimitError instead of raising it and only logs the failures
+    once the batch is done. This filter watches that log, letting every record through unchanged, so a
+    rate-limited batch can be told apart from tickers that simply have no data.
     """
-    print(f"    - Fetching max ({MAX_LOOKBACK} years) data for {ticker}...")
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=MAX_LOOKBACK * 365.25)
-    
-    stock_ticker = yf.Ticker(ticker)
-    data = stock_ticker.history(start=start_date, end=end_date, auto_adjust=True)
-    
-    if data.empty:
-        raise ValueError(f"No data returned for ticker {ticker}.")
-    
-    data.index = data.index.tz_localize(None)
-    return data['Close']
+    def __init__(self):
+        super().__init__()
+        self.rate_limited = False
+
+    def filter(self, record):
+        if 'YFRateLimitError' in record.getMessage():
+            self.rate_limited = True
+        return True
+
+rate_limit_watcher = RateLimitWatcher()
+logging.getLogger('yfinance').addFilter(rate_limit_watcher)
+
+# Threads the next yf.download call runs with. Halved whenever Yahoo rate-limits a batch and raised by one
+# after every batch that downloads cleanly, so the scan settles just under the limit instead of at a guess.
+download_threads = MAX_WORKERS // 2
 
-# --- Core Logic to Calculate Metrics for a Single Ticker ---
-def calculate_metrics_for_ticker(prices, forward_months, today, trading_days_in_month):
+def download_closes(tickers, start_date, end_date):
     """
-    Calculates all performance metrics for a single ticker's price history.
+    Downloads daily closing prices for a list of tickers between two dates in one threaded yfinance batch.
+    Returns a dict of ticker -> closes, leaving out tickers that came back without data.
+    Tickers that were rate-limited are retried with exponential backoff and fewer threads.
     """
-    forward_days = forward_months * trading_days_in_month
-    all_returns = []
-    
-    if prices.empty or prices.isnull().all():
-        return None
+    global download_threads
 
-    prices = prices.dropna()
-    if prices.empty:
-        return None
+    closes = {}
+    pending = tickers
+    for attempt in range(1, DOWNLOAD_RETRIES + 1):
+        rate_limit_watcher.rate_limited = False
+        data = yf.download(pending, start=start_date, end=end_date, auto_adjust=True, group_by='ticker',
+                           threads=download_threads, progress=False)
 
-    start_year_of_data = prices.index.year.min()
+        for ticker in pending:
+            if ticker in data.columns.get_level_values(0):
+                ticker_closes = data[ticker]['Close'].dropna()
+                if not ticker_closes.empty:
+                    closes[ticker] = ticker_closes
 
-    for year in range(start_year_of_data, today.year):
-        start_date_past = datetime(year, today.month, today.day)
-        
+        if not rate_limit_watcher.rate_limited:
+            download_threads = min(download_threads + 1, MAX_WORKERS)
+            break
+
+        download_threads = max(download_threads // 2, 1)
+        pending = [ticker for ticker in pending if ticker not in closes]
+        if attempt < DOWNLOAD_RETRIES:
+            delay = min(60, 2 ** attempt + random.random())
+            print(f"    - Rate limited on {len(pending)} tickers; retrying in {delay:.1f}s with {download_threads} threads...")
+            time.sleep(delay)
+    return closes
+
+def fetch_price_history(tickers):
+    """
+    Fetches historical daily price data for a batch of tickers for the maximum lookback period.
+    Returns a dict of ticker -> closes; tickers without any data are left out.
+    Closes are cached on disk per ticker, so repeat runs only download the days added since the last run.
+    """
+    end_date = datetime.now()
+    start_date = end_date - timedelta(days=MAX_LOOKBACK * 365.25)
+
+    history = {}
+    stale = {}
+    for ticker in tickers:
+        cache_path = os.path.join(PRICE_CACHE_DIR, f"{ticker}.parquet")
+        if not os.path.exists(cache_path):
+            continue
         try:
-            actual_start_idx = prices.index.searchsorted(start_date_past)
-            actual_end_idx = actual_start_idx + forward_days
-
-            if actual_end_idx < len(prices):
-                start_price = prices.iloc[actual_start_idx]
-                end_price = prices.iloc[actual_end_idx]
-                
-                if start_price > 0:
-                    log_return = np.log(end_price / start_price)
-                    all_returns.append(log_return)
-        except Exception:
+            closes = pd.read_parquet(cache_path)['Close']
+        except Exception as e:
+            # A truncated or corrupt file is treated as a cache miss and replaced by a full download.
+            print(f"    - WARNING: Unreadable price cache for {ticker}, downloading it again. Reason: {e}")
             continue
+        if time.time() - os.path.getmtime(cache_path) < PRICE_CACHE_MAX_AGE_HOURS * 3600:
+            history[ticker] = closes[closes.index >= start_date]
+        elif closes.index[-1] >= end_date - timedelta(days=PRICE_CACHE_MAX_GAP_DAYS):
+            stale[ticker] = closes
+        else:
+            os.remove(cache_path)
 
-    if not all_returns:
-        return None
+    updated = {}
+    if stale:
+        # Re-download from each ticker's second-to-last cached day: the last one may have been a partial session,
+        # and the overlapping close shows whether a dividend or split has re-adjusted the history since.
+        # Every stale history ends within PRICE_CACHE_MAX_GAP_DAYS, so the shared start stays recent.
+        anchors = {ticker: closes.index[-min(2, len(closes))] for ticker, closes in stale.items()}
+        since = min(anchors.values())
+        print(f"    - Fetching {len(stale)} cached tickers since {since.strftime('%Y-%m-%d')}...")
+        recent = download_closes(list(stale), since, end_date)
 
-    percent_returns = [(np.exp(lr) - 1) * 100 for lr in all_returns]
+        for ticker, closes in stale.items():
+            anchor = anchors[ticker]
+            if ticker not in recent:
+                # Served as cached for now but not rewritten, so the next run tries to update it again.
+                history[ticker] = closes[closes.index >= start_date]
+                continue
+            new_rows = recent[ticker][recent[ticker].index >= anchor]
+            if not new_rows.empty and new_rows.index[0] == anchor and np.isclose(new_rows.iloc[0], closes[anchor]):
+                updated[ticker] = pd.concat([closes[closes.index < anchor], new_rows])
+
+    missing = [ticker for ticker in tickers if ticker not in history and ticker not in updated]
+    if missing:
+        print(f"    - Fetching max ({MAX_LOOKBACK} years) data for {len(missing)} tickers...")
+        updated.update(download_closes(missing, start_date, end_date))
+
+    os.makedirs(PRICE_CACHE_DIR, exist_ok=True)
+    for ticker, closes in updated.items():
+        closes = closes[closes.index >= start_date]
+        # Written next to the old file and swapped in, so a killed run never leaves a half-written cache behind.
+        cache_path = os.path.join(PRICE_CACHE_DIR, f"{ticker}.parquet")
+        closes.to_frame('Close').to_parquet(cache_path + '.tmp', compression='zstd')
+        os.replace(cache_path + '.tmp', cache_path)
+        history[ticker] = closes
+    return history
+
+# --- Helper Function to Build Each Year's Anniversary of Today ---
+def find_anniversary_dates(today):
+    """
+    Returns today's month/day in every past year of the maximum lookback, and the date each forward period
+    after it ends, as epoch days. The years are returned alongside the dates so callers can filter them by lookback.
+    """
+    # Build each year's anniversary as epoch months plus a day offset; no datetime objects are created.
+    first_year = (today - timedelta(days=MAX_LOOKBACK * 365.25)).year
+    years = np.arange(first_year, today.year)
+    month_starts = ((years - 1970) * 12 + (today.month - 1)).astype('datetime64[M]')
+    target_dates = month_starts.astype('datetime64[D]') + (today.day - 1)
+
+    # Feb 29 rolls over into March in non-leap years; those years have no anniversary and are left out.
+    exists = target_dates.astype('datetime64[M]') == month_starts
+    years, month_starts, target_dates = years[exists], month_starts[exists], target_dates[exists]
+
+    # Forward periods end on the same day of a later calendar month, or on that month's last day if it is shorter,
+    # so a period covers the same span of the calendar whichever exchange's trading days fall inside it.
+    end_month_starts = month_starts[:, None] + np.array(FORWARD_PERIODS_MONTHS)
+    end_dates = np.minimum(end_month_starts.astype('datetime64[D]') + (today.day - 1),
+                           (end_month_starts + 1).astype('datetime64[D]') - 1)
+    return years, target_dates.view('i8'), end_dates.view('i8')
+
+# --- Core Logic to Calculate Metrics for a Batch of Tickers at Once ---
+def calculate_metrics_for_tickers(values, start_idx, end_idx, in_window):
+    """
+    Calculates all performance metrics for one lookback of every ticker in a batch, for every forward period in one pass.
+    'values' is the (dates x tickers) price matrix, 'start_idx' the (years x tickers) row of each sampled year's start,
+    'end_idx' the (years x forwards) rows where each forward period ends and 'in_window' the (years x tickers) mask of
+    the years inside each ticker's lookback. Returns one (forwards x tickers) array per metric; a ticker without a single
+    valid sample for a forward period has 'yearsOfData' of 0 there.
+    """
+    # A period that ends after the last row has not completed yet, and one that ends before the ticker's first close
+    # (an anniversary just before it listed) has no return.
+    in_range = end_idx < len(values)
+    after_start = end_idx[:, :, None] > start_idx[:, None, :]
+
+    # (years x forwards x tickers) returns; NaNs mark rows before a ticker listed or after its last close.
+    # The start prices are gathered once and shared by every forward period.
+    start_prices = np.take_along_axis(values, np.minimum(start_idx, len(values) - 1), axis=0)[:, None, :]
+    end_prices = values[np.where(in_range, end_idx, 0)]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        percent_returns = (end_prices / start_prices - 1) * 100
+    valid = in_range[:, :, None] & after_start & in_window[:, None, :] & (start_prices > 0) & ~np.isnan(percent_returns)
+
+    years_of_data = np.count_nonzero(valid, axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        win_rate = np.count_nonzero(valid & (percent_returns > 0), axis=0) / years_of_data * 100
+        avg_return = percent_returns.sum(axis=0, where=valid) / years_of_data
 
-    win_rate = (len([r for r in percent_returns if r > 0]) / len(percent_returns)) * 100
-    avg_return = np.mean(percent_returns)
-    max_profit = np.max(percent_returns)
-    max_loss = np.min(percent_returns)
-    
     return {
         'winRate': win_rate,
         'avgReturn': avg_return,
-        'maxProfit': max_profit,
-        'maxLoss': max_loss,
-        'yearsOfData': len(all_returns)
+        'maxProfit': percent_returns.max(axis=0, initial=-np.inf, where=valid),
+        'maxLoss': percent_returns.min(axis=0, initial=np.inf, where=valid),
+        'yearsOfData': years_of_data
     }
 
-# --- Main Execution Block (Sequential) ---
-def run_scan():
+# --- Main Execution Block (Batched Fetch) ---
+def run_scan(asset_classes=None):
     """
-    Orchestrates the entire process sequentially for reliability.
+    Orchestrates the entire process, downloading and scoring each asset class in batches of tickers.
+    'asset_classes' limits the scan to the named classes; the results of the others are kept from the existing file.
     """
     today = datetime.today()
     print(f"Starting daily seasonality scan for date: {today.strftime('%Y-%m-%d')}")
+
+    # The anniversaries depend only on today's date, so they are built once for every ticker.
+    years, target_days, end_days = find_anniversary_dates(today)
     
     final_output = {}
+    if asset_classes and os.path.exists(OUTPUT_FILE):
+        with open(OUTPUT_FILE, 'rb') as f:
+            final_output = orjson.loads(f.read())
 
     for config in ASSET_CONFIGS:
+        if asset_classes and config['name'] not in asset_classes:
+            continue
         asset_name = config['name']
         ticker_file = config['file']
-        trading_days_in_month = config['trading_days_in_month']
         print(f"\n========================================")
         print(f"Processing Asset Class: {asset_name}")
         print(f"========================================")
@@ -135,29 +268,70 @@ def run_scan():
                 key = f"{forward}m_{lookback}y"
                 asset_results[key] = []
         
-        for ticker in tickers:
-            print(f"\n[Processing Ticker: {ticker}]")
+        for batch_start in range(0, len(tickers), DOWNLOAD_BATCH_SIZE):
+            batch = tickers[batch_start:batch_start + DOWNLOAD_BATCH_SIZE]
+            try:
+                price_history = fetch_price_history(batch)
+            except Exception as e:
+                print(f"  --> ERROR fetching tickers {batch[0]} to {batch[-1]}. Reason: {e}")
+                continue
+
+            batch_tickers = []
+            for ticker in batch:
+                if ticker in price_history:
+                    batch_tickers.append(ticker)
+                else:
+                    print(f"  --> ERROR processing {ticker}. Reason: No data returned for ticker {ticker}.")
+            if not batch_tickers:
+                continue
+
             try:
-                prices = fetch_price_history(ticker)
-                
+                # Align the batch on its combined trading calendar. A day a ticker has no close takes its next one,
+                # as when it is searched on its own calendar; days before it listed or after it stopped stay NaN.
+                prices = pd.concat([price_history[ticker] for ticker in batch_tickers], axis=1).sort_index()
+                has_close = prices.notna().to_numpy()
+                prices = prices.bfill().where(prices.ffill().notna())
+
+                # Locate every anniversary once and reuse the rows for all tickers and permutations.
+                # float32 is ample for percent returns shown to two decimals and halves the matrix size.
+                values = prices.to_numpy(dtype=np.float32)
+                index_days = prices.index.values.astype('datetime64[D]').view('i8')
+                start_idx = np.searchsorted(index_days, target_days)
+                end_idx = np.searchsorted(index_days, end_days)
+
                 for lookback in LOOKBACK_PERIODS_YEARS:
                     lookback_start_date = today - timedelta(days=lookback * 365.25)
-                    prices_for_lookback = prices[prices.index >= lookback_start_date]
-                    
-                    for forward in FORWARD_PERIODS_MONTHS:
+                    cut = prices.index.searchsorted(lookback_start_date)
+                    if cut == len(prices):
+                        continue
+
+                    # Each ticker's window opens on its own first close from the cut, which is later for a ticker
+                    # that listed inside the window or has no close on the cut row, and can fall in a later year.
+                    in_lookback = years >= prices.index[cut].year
+                    first_close_idx = cut + np.argmax(has_close[cut:], axis=0)
+                    in_window = years[in_lookback][:, None] >= prices.index[first_close_idx].year.to_numpy()
+
+                    # An anniversary that falls before a ticker's window opens starts from its first close.
+                    lookback_start_idx = np.maximum(start_idx[in_lookback][:, None], first_close_idx)
+
+                    metrics = calculate_metrics_for_tickers(values, lookback_start_idx, end_idx[in_lookback], in_window)
+                    for f, forward in enumerate(FORWARD_PERIODS_MONTHS):
                         key = f"{forward}m_{lookback}y"
-                        metrics = calculate_metrics_for_ticker(prices_for_lookback, forward, today, trading_days_in_month)
-                        
-                        if metrics:
-                            metrics['ticker'] = ticker
-                            asset_results[key].append(metrics)
-                
-                print(f"  - SUCCESS: Finished all permutations for {ticker}.")
-                # Add a small delay to be respectful to the API provider and avoid rate limits.
-                time.sleep(0.01) 
+                        for i, ticker in enumerate(batch_tickers):
+                            if metrics['yearsOfData'][f, i]:
+                                asset_results[key].append({
+                                    'winRate': metrics['winRate'][f, i],
+                                    'avgReturn': metrics['avgReturn'][f, i],
+                                    'maxProfit': metrics['maxProfit'][f, i],
+                                    'maxLoss': metrics['maxLoss'][f, i],
+                                    'yearsOfData': int(metrics['yearsOfData'][f, i]),
+                                    'ticker': ticker
+                                })
+
+                print(f"  - SUCCESS: Finished all permutations for {len(batch_tickers)} tickers ({batch[0]} to {batch[-1]}).")
 
             except Exception as e:
-                print(f"  --> ERROR processing {ticker}. Reason: {e}")
+                print(f"  --> ERROR processing tickers {batch[0]} to {batch[-1]}. Reason: {e}")
         
         final_output[asset_name] = asset_results
 
@@ -165,10 +339,18 @@ def run_scan():
     os.makedirs(output_dir, exist_ok=True)
     
     print(f"\nWriting combined results to {OUTPUT_FILE}...")
-    with open(OUTPUT_FILE, 'w') as f:
-        json.dump(final_output, f, indent=2)
+    # orjson writes the NumPy metric scalars directly, so none of them are converted to Python floats first.
+    # The file is written next to the old one and swapped in, so a killed run never leaves it half-written.
+    tmp_file = OUTPUT_FILE + '.tmp'
+    with open(tmp_file, 'wb') as f:
+        f.write(orjson.dumps(final_output, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
+    os.replace(tmp_file, OUTPUT_FILE)
         
     print(f"✅ Scan complete. Results saved successfully.")
 
 if __name__ == "__main__":
-    run_scan()
+    parser = argparse.ArgumentParser(description="Calculates the daily seasonality scan and writes it to " + OUTPUT_FILE)
+    parser.add_argument('--asset-classes', nargs='+', choices=[config['name'] for config in ASSET_CONFIGS],
+                        help="only rescan these asset classes (default: all of them)")
+    args = parser.parse_args()
+    run_scan(args.asset_classes)